@@ -55,7 +55,10 @@ Update your analysis by handling situations where the Problem Dampener can remov
 
 '''
 
+import random
+import timeit
 from pathlib import Path
+import numpy as np
 from advent_of_code_2024.constants import DATA_DIR
 
 EXAMPLE = DATA_DIR / 'day2_example.txt'
@@ -99,8 +102,100 @@ def determine_safety_part_two(levels: list[int]) -> int:
 
     return 0
 
+def is_safe_step(level_1: int, level_2: int, direction: int) -> bool:
+    return 1 <= direction * (level_2 - level_1) <= 3
+
+def find_first_violation(levels: list[int], direction: int, skip: int = -1) -> int:
+    ''' Index (into `levels`) of the first level whose step from the previous kept level is unsafe,
+    ignoring the level at `skip`.  Returns -1 if every step is safe.'''
+    previous = None
+    for i, level in enumerate(levels):
+        if i == skip:
+            continue
+        if previous is not None and not is_safe_step(previous, level, direction):
+            return i
+        previous = level
+    return -1
+
+def determine_safety_linear(levels: list[int]) -> int:
+    ''' O(n) equivalent of `determine_safety_part_two`.  For each orientation, find the first bad 
+    step (i-1, i); a single removal can only fix it by dropping one of those two levels, so those 
+    are the only candidates worth re-checking.'''
+    if len(levels) <= 2:
+        return 1
+    for direction in (1, -1):
+        bad_idx = find_first_violation(levels, direction)
+        if bad_idx == -1:
+            return 1
+        for candidate in (bad_idx - 1, bad_idx):
+            if find_first_violation(levels, direction, skip=candidate) == -1:
+                return 1
+    return 0
    
 
+def ingest_padded(filename: Path) -> tuple[np.ndarray, np.ndarray]:
+    ''' Parse every report at once into a zero-padded (reports x max_levels) int64 array plus
+    each report's length, without building a Python list per line.'''
+    with open(filename, 'rb') as f:
+        data = f.read()
+    
+    chars = np.frombuffer(data, dtype=np.uint8)
+    is_digit = (chars >= ord('0')) & (chars <= ord('9'))
+    token_starts = np.flatnonzero(is_digit & ~np.concatenate(([False], is_digit[:-1])))
+    line_ids = np.cumsum(chars == ord('\n'))[token_starts]
+    lengths = np.bincount(line_ids, minlength=int(line_ids[-1]) + 1 if line_ids.size else 0)
+    lengths = lengths[lengths > 0]
+
+    flat_levels = np.fromstring(data.decode(), dtype=np.int64, sep=' ')
+    max_levels = int(lengths.max()) if lengths.size else 0
+    levels = np.zeros((lengths.size, max_levels), dtype=np.int64)
+    levels[np.arange(max_levels) < lengths[:, None]] = flat_levels
+    return (levels, lengths)
+
+def batch_step_checks(levels: np.ndarray, lengths: np.ndarray, direction: int) -> np.ndarray:
+    ''' (reports x max_levels-1) bool array of safe steps; steps past a report's end count as safe.'''
+    steps = direction * np.diff(levels, axis=1)
+    past_end = np.arange(levels.shape[1] - 1) >= (lengths[:, None] - 1)
+    return ((steps >= 1) & (steps <= 3)) | past_end
+
+def batch_safety_part_one(levels: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    return (batch_step_checks(levels, lengths, 1).all(axis=1) 
+            | batch_step_checks(levels, lengths, -1).all(axis=1))
+
+def batch_safety_part_two(levels: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    ''' Dampened safety for every report.  Removing level s leaves the steps before s-1 and after
+    s untouched, so with prefix/suffix "all steps safe" arrays each removal is checked in O(1):
+        prefix_ok[s-2]  &  bridge_ok(s-1 -> s+1)  &  suffix_ok[s+1]'''
+    num_reports, max_levels = levels.shape
+    safe = batch_safety_part_one(levels, lengths)
+    if max_levels < 2:
+        return safe
+
+    cols = np.arange(max_levels)
+    for direction in (1, -1):
+        step_ok = batch_step_checks(levels, lengths, direction)
+        prefix_ok = np.logical_and.accumulate(step_ok, axis=1)
+        suffix_ok = np.logical_and.accumulate(step_ok[:, ::-1], axis=1)[:, ::-1]
+        all_true = np.ones((num_reports, 2), dtype=bool)
+        prefix_ok = np.hstack((all_true, prefix_ok))  # prefix_ok[:, s] == all steps before s-1 safe
+        suffix_ok = np.hstack((suffix_ok, all_true))  # suffix_ok[:, s+1] == all steps from s+1 on safe
+
+        bridge_steps = direction * (levels[:, 2:] - levels[:, :-2])
+        bridge_ok = np.ones((num_reports, max_levels), dtype=bool)
+        bridge_ok[:, 1:-1] = ((bridge_steps >= 1) & (bridge_steps <= 3)) | (cols[2:] >= lengths[:, None])
+
+        removal_ok = prefix_ok[:, :max_levels] & bridge_ok & suffix_ok[:, 1:max_levels+1]
+        safe |= (removal_ok & (cols < lengths[:, None])).any(axis=1)
+    return safe
+
+def part_one_batch(filename: Path = INPUT) -> int:
+    levels, lengths = ingest_padded(filename)
+    return int(batch_safety_part_one(levels, lengths).sum())
+
+def part_two_batch(filename: Path = INPUT) -> int:
+    levels, lengths = ingest_padded(filename)
+    return int(batch_safety_part_two(levels, lengths).sum())
+
 def part_one():
     lines = ingest_data(INPUT)
     safety_checks = [determine_safety_part_one(line) for line in lines]
@@ -109,14 +204,44 @@ def part_one():
 
 def part_two():
     lines = ingest_data(INPUT)
-    safety_checks = [determine_safety_part_two(line) for line in lines]
+    safety_checks = [determine_safety_linear(line) for line in lines]
     answer = sum(safety_checks)
     return answer  # 493
 
+def random_report(num_levels: int) -> list[int]:
+    ''' Mostly-safe report with the occasional bad step, so the dampener actually gets exercised.'''
+    direction = random.choice((1, -1))
+    levels = [random.randint(1, 99)]
+    for _ in range(num_levels - 1):
+        step = direction * random.randint(1, 3) if random.random() > 0.1 else random.randint(-5, 5)
+        levels.append(levels[-1] + step)
+    return levels
+
+def random_tests(num_reports: int = 100_000) -> None:
+    ''' Differential test of `determine_safety_linear` against the original part one/two checks.'''
+    for _ in range(num_reports):
+        levels = random_report(random.randint(3, 10))
+        assert determine_safety_linear(levels) == determine_safety_part_two(levels), levels
+        if determine_safety_part_one(levels) == 1:
+            assert determine_safety_linear(levels) == 1, levels
+    print(f"{num_reports:,} random reports agree")
+
+def benchmark_long_reports(num_levels: int = 10**4, num_reports: int = 5) -> None:
+    reports = [random_report(num_levels) for _ in range(num_reports)]
+    original_time = timeit.timeit(lambda: [determine_safety_part_two(levels) for levels in reports], number=1)
+    linear_time = timeit.timeit(lambda: [determine_safety_linear(levels) for levels in reports], number=1)
+    print(f"{num_reports} reports x {num_levels:,} levels:  original {original_time:.3f}s  |  linear {linear_time:.4f}s")
+
 def main():
     print(f"Part One:  {part_one()}")
     print(f"Part Two:  {part_two()}")
 
+    print(f"Part One (batch):  {part_one_batch()}")
+    print(f"Part Two (batch):  {part_two_batch()}")
+
+    # random_tests()
+    # benchmark_long_reports()
+
    
 
 if __name__ == '__main__':
@@ -38,7 +38,15 @@ This time, the sum of the results is 48 (2*4 + 8*5).
 Handle the new instructions; what do you get if you add up all of the results of just the enabled multiplications?
 '''
 
+import functools
+import mmap
+import os
+import random
 import re
+import timeit
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
 from advent_of_code_2024.constants import DATA_DIR
 
@@ -53,6 +61,10 @@ DO_PATTERN = r"(?P<do>do\(\))"
 DONT_PATTERN = r"(?P<dont>don't\(\))"
 REGEX_PART_TWO = MUL_PATTERN + '|' + DO_PATTERN + '|' + DONT_PATTERN
 
+MAX_TOKEN_LENGTH = len('mul(123,123)')
+CHUNK_SIZE = 1 << 20
+PARALLEL_CHUNK_SIZE = 1 << 24
+
 def ingest_data(filename: Path) -> str:
     with open(filename, 'r') as f:
         text = f.read()
@@ -62,13 +74,74 @@ def parse_mul(text: str) -> int:
     num1, num2 = text.removeprefix('mul(').removesuffix(')').split(',')
     return int(num1) * int(num2)
 
-def part_one(filename: Path) -> int:
+def ingest_bytes(filename: Path) -> bytes:
+    with open(filename, 'rb') as f:
+        return f.read()
+
+def scan_state_machine(data: bytes, handle_toggles: bool = True) -> int:
+    ''' Hand-written alternative to the regex engine.  Between tokens the scanner jumps straight
+    to the next `mul(` / `do` anchor (a memchr-style skip), then walks the token body byte by byte:
+    up to 3 digits, `,`, up to 3 digits, `)` -- accumulating the numbers as it goes, so no match
+    objects or substrings are created.'''
+    n = len(data)
+    total = 0
+    enabled = True
+    next_mul = data.find(b'mul(')
+    next_do = data.find(b'do') if handle_toggles else -1
+
+    while next_mul != -1 or next_do != -1:
+        if next_do != -1 and (next_mul == -1 or next_do < next_mul):
+            if data.startswith(b'()', next_do + 2):
+                enabled = True
+            elif data.startswith(b"n't()", next_do + 2):
+                enabled = False
+            next_do = data.find(b'do', next_do + 2)
+            continue
+
+        i = next_mul + 4
+        next_mul = data.find(b'mul(', i)
+
+        num1 = 0
+        stop = min(i + 3, n)
+        start = i
+        while i < stop and 48 <= data[i] <= 57:
+            num1 = num1 * 10 + data[i] - 48
+            i += 1
+        if i == start or i >= n or data[i] != 44:  # ','
+            continue
+        
+        i += 1
+        num2 = 0
+        stop = min(i + 3, n)
+        start = i
+        while i < stop and 48 <= data[i] <= 57:
+            num2 = num2 * 10 + data[i] - 48
+            i += 1
+        if i == start or i >= n or data[i] != 41:  # ')'
+            continue
+
+        if enabled:
+            total += num1 * num2
+
+    return total
+
+def part_one(filename: Path, engine: str = 'regex') -> int:
+    if engine == 'state_machine':
+        return scan_state_machine(ingest_bytes(filename), handle_toggles=False)
+    elif engine != 'regex':
+        raise ValueError(f"Unknown engine: {engine}")
+    
     text = ingest_data(filename)
     pattern = re.compile(REGEX_PART_ONE)
     muls = pattern.findall(text)
     return sum([parse_mul(mul) for mul in muls])
 
-def part_two(filename: Path) -> int:
+def part_two(filename: Path, engine: str = 'regex') -> int:
+    if engine == 'state_machine':
+        return scan_state_machine(ingest_bytes(filename))
+    elif engine != 'regex':
+        raise ValueError(f"Unknown engine: {engine}")
+
     text = ingest_data(filename)
     pattern = re.compile(REGEX_PART_TWO)
     matches = pattern.finditer(text)
@@ -88,6 +161,134 @@ def part_two(filename: Path) -> int:
 
     return total
 
+def parse_mul_bytes(token: bytes) -> int:
+    num1, num2 = token[4:-1].split(b',')
+    return int(num1) * int(num2)
+
+def stream_tokens(filename: Path, pattern: re.Pattern[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    ''' Yield the same tokens as `pattern.finditer` over the whole file, reading it `chunk_size`
+    bytes at a time.  A match starting more than `MAX_TOKEN_LENGTH` bytes before the end of the
+    buffer fits entirely inside it, so it's final; anything after that point is carried over and
+    re-scanned together with the next chunk.'''
+    carry = b''
+    with open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer = carry + chunk
+            at_eof = not chunk
+            cutoff = len(buffer) if at_eof else len(buffer) - MAX_TOKEN_LENGTH + 1
+            
+            resume_at = max(cutoff, 0)
+            for m in pattern.finditer(buffer):
+                if m.start() >= cutoff:
+                    break
+                yield m.group(0)
+                resume_at = max(resume_at, m.end())
+            
+            if at_eof:
+                return
+            carry = buffer[resume_at:]
+
+def part_one_streaming(filename: Path, chunk_size: int = CHUNK_SIZE) -> int:
+    pattern = re.compile(REGEX_PART_ONE.encode())
+    return sum(parse_mul_bytes(token) for token in stream_tokens(filename, pattern, chunk_size))
+
+def part_two_streaming(filename: Path, chunk_size: int = CHUNK_SIZE) -> int:
+    pattern = re.compile(REGEX_PART_TWO.encode())
+
+    total = 0
+    enabled = True
+    for token in stream_tokens(filename, pattern, chunk_size):
+        match token:
+            case b"do()":
+                enabled = True
+            case b"don't()":
+                enabled = False
+            case _ if enabled:
+                total += parse_mul_bytes(token)
+
+    return total
+
+
+@dataclass(frozen=True)
+class ChunkSummary():
+    ''' What a chunk contributes to part two, independent of the state it starts in:
+    - `before_toggle`: sum of products before the chunk's first do()/don't() (counts only if enabled on entry)
+    - `after_toggle`: sum of products after the first toggle that were enabled at the time
+    - `final_state`: enabled flag at the end of the chunk, or None if the chunk has no toggle'''
+    before_toggle: int = 0
+    after_toggle: int = 0
+    final_state: bool | None = None
+
+    def combine(self, other: 'ChunkSummary') -> 'ChunkSummary':
+        ''' Summary of `self` followed by `other`.  Associative, so chunks can be reduced in any grouping.'''
+        if self.final_state is None:
+            return ChunkSummary(self.before_toggle + other.before_toggle, other.after_toggle, other.final_state)
+        
+        carried_over = other.before_toggle if self.final_state else 0
+        final_state = self.final_state if other.final_state is None else other.final_state
+        return ChunkSummary(self.before_toggle, self.after_toggle + carried_over + other.after_toggle, final_state)
+
+    def total(self, enabled: bool = True) -> int:
+        return (self.before_toggle if enabled else 0) + self.after_toggle
+
+def summarize_chunk(filename: Path, start: int, end: int) -> ChunkSummary:
+    ''' Summarize the tokens that start in bytes [start, end).  No token can start inside another
+    one, so scanning from `start` finds exactly the tokens a full scan would; reading up to
+    `MAX_TOKEN_LENGTH` bytes past `end` catches the one that straddles the boundary.'''
+    pattern = re.compile(REGEX_PART_TWO.encode())
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        before_toggle = 0
+        after_toggle = 0
+        enabled: bool | None = None
+        for m in pattern.finditer(mm, start, min(end + MAX_TOKEN_LENGTH - 1, len(mm))):
+            if m.start() >= end:
+                break
+            match m.group(0):
+                case b"do()":
+                    enabled = True
+                case b"don't()":
+                    enabled = False
+                case token if enabled is None:
+                    before_toggle += parse_mul_bytes(token)
+                case token if enabled:
+                    after_toggle += parse_mul_bytes(token)
+    return ChunkSummary(before_toggle, after_toggle, enabled)
+
+def part_two_parallel(filename: Path, max_workers: int | None = None, chunk_size: int = PARALLEL_CHUNK_SIZE) -> int:
+    file_size = os.path.getsize(filename)
+    if file_size == 0:
+        return 0
+    starts = range(0, file_size, chunk_size)
+    ends = [min(start + chunk_size, file_size) for start in starts]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        summaries = executor.map(summarize_chunk, [filename] * len(starts), starts, ends)
+        return functools.reduce(ChunkSummary.combine, summaries, ChunkSummary()).total()
+
+def write_random_dump(filename: Path, size_mb: int) -> None:
+    snippets = ['mul(2,4)', "don't()", 'do()', 'mul[3,7]', 'mul(32,64]', 'xmul(11,8)', '!@^', 'mul ( 2 , 4 )', 'mul(123,4)', 'what()']
+    block = ''.join(random.choices(snippets, k=100_000))
+    with open(filename, 'w') as f:
+        for _ in range((size_mb << 20) // len(block) + 1):
+            f.write(block)
+
+def benchmark_parallel(size_mb: int = 512, worker_counts: tuple[int, ...] = (1, 2, 4, 8),
+                       filename: Path = Path('/tmp/day3_benchmark.txt')) -> None:
+    write_random_dump(filename, size_mb)
+    sequential_time = timeit.timeit(lambda: part_two(filename), number=1)
+    print(f"{size_mb} MB sequential:  {sequential_time:.2f}s")
+    for max_workers in worker_counts:
+        parallel_time = timeit.timeit(lambda: part_two_parallel(filename, max_workers), number=1)
+        print(f"{size_mb} MB with {max_workers} workers:  {parallel_time:.2f}s  ({sequential_time / parallel_time:.1f}x)")
+
+def benchmark_engines(size_mb: int = 128, filename: Path = Path('/tmp/day3_benchmark.txt')) -> None:
+    write_random_dump(filename, size_mb)
+    for engine in ['regex', 'state_machine']:
+        part_one_time = timeit.timeit(lambda: part_one(filename, engine), number=1)
+        part_two_time = timeit.timeit(lambda: part_two(filename, engine), number=1)
+        print(f"{size_mb} MB, {engine:>13}:  part one {part_one_time:.2f}s  |  part two {part_two_time:.2f}s")
+
 
 def main():
     print(f"Part One (example):  {part_one(EXAMPLE_PART_ONE)}")
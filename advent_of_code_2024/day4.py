@@ -69,7 +69,13 @@ In this example, an X-MAS appears 9 times.
 Flip the word search from the instructions back over to the word search side and try again. How many times does an X-MAS appear?
 '''
 
+import os
 import re
+import timeit
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
 import pandas as pd
 import numpy as np
 from pathlib import Path
@@ -84,6 +90,11 @@ PART_2_SQUARE_WIDTH = 3
 REGEX_PART_ONE = r'(?=(?P<forward>XMAS)|(?P<backward>SAMX))'
 REGEX_PART_TWO = r'M.S.A.M.S|S.M.A.S.M|M.M.A.S.S|S.S.A.M.M'
 
+WORD_PART_ONE = 'XMAS'
+DIRECTIONS = [(0, 1), (1, 0), (1, 1), (1, -1), (0, -1), (-1, 0), (-1, -1), (-1, 1)]  # (row step, col step)
+SCAN_DIRECTIONS = DIRECTIONS[:4]  # the other four are covered by scanning for reversed words
+TILE_ROWS = 1_000
+
 def ingest_data(filename: Path) -> list[str]:
     with open(filename, 'r') as f:
         line_list = [line.strip('\n') for line in f.readlines()]
@@ -128,7 +139,50 @@ def regex_part_one(input: str) -> int:
 
     return total
 
-def part_one(filename: Path) -> int:   
+def ingest_grid(filename: Path) -> np.ndarray:
+    ''' The word search as a (rows x cols) uint8 array of ASCII codes.'''
+    with open(filename, 'rb') as f:
+        data = f.read().replace(b'\r', b'').rstrip(b'\n')
+    num_cols = data.index(b'\n') if b'\n' in data else len(data)
+    chars = np.frombuffer(data, dtype=np.uint8)
+    return chars[chars != ord('\n')].reshape(-1, num_cols)
+
+def shifted_window(grid: np.ndarray, direction: tuple[int, int], word_length: int, offset: int) -> np.ndarray:
+    ''' View of the cells `offset` steps along `direction` from every start cell that leaves 
+    room for the whole word inside the grid.'''
+    num_rows, num_cols = grid.shape
+    row_step, col_step = direction
+    span = word_length - 1
+    row_start = max(0, -row_step * span) + row_step * offset
+    row_stop = num_rows - max(0, row_step * span) + row_step * offset
+    col_start = max(0, -col_step * span) + col_step * offset
+    col_stop = num_cols - max(0, col_step * span) + col_step * offset
+    return grid[row_start:row_stop, col_start:col_stop]
+
+def count_word(grid: np.ndarray, word: str, directions: list[tuple[int, int]] = DIRECTIONS,
+               start_rows: tuple[int, int] | None = None) -> int:
+    ''' Count occurrences of `word` in every direction by AND-ing one shifted comparison per letter.
+    With `start_rows`, only occurrences whose first letter sits in rows [start, stop) are counted.'''
+    num_rows, num_cols = grid.shape
+    first_row, last_row = start_rows if start_rows is not None else (0, num_rows)
+    span = len(word) - 1
+
+    total = 0
+    for direction in directions:
+        if (direction[0] and span >= num_rows) or (direction[1] and span >= num_cols):
+            continue
+        matches = shifted_window(grid, direction, len(word), 0) == ord(word[0])
+        for offset, letter in enumerate(word[1:], start=1):
+            matches &= shifted_window(grid, direction, len(word), offset) == ord(letter)
+        row_origin = max(0, -direction[0] * span)  # grid row of the first row of `matches`
+        total += int(np.count_nonzero(matches[max(0, first_row - row_origin):max(0, last_row - row_origin)]))
+    return total
+
+def part_one(filename: Path) -> int:
+    grid = ingest_grid(filename)
+    return count_word(grid, WORD_PART_ONE)
+
+def part_one_regex(filename: Path) -> int:   
     horizontal_line_list = ingest_data(filename)
     horizontal_total = sum(regex_part_one(line) for line in horizontal_line_list)
 
@@ -159,7 +213,26 @@ def get_squares(horizontal_line_list: list[str], vertical_line_list: list[str])
             output_list.append(sq1 + sq2 + sq3)
     return output_list
 
+def count_x_mas(grid: np.ndarray) -> int:
+    ''' Part two as a 3x3 stencil: an `A` in the centre, and each diagonal through it reads MAS
+    one way or the other (M on one corner, S on the opposite one).'''
+    if min(grid.shape) < PART_2_SQUARE_HEIGHT:
+        return 0
+    
+    m, a, s = ord('M'), ord('A'), ord('S')
+    centre = grid[1:-1, 1:-1]
+    top_left, top_right = grid[:-2, :-2], grid[:-2, 2:]
+    bottom_left, bottom_right = grid[2:, :-2], grid[2:, 2:]
+
+    falling_diagonal = ((top_left == m) & (bottom_right == s)) | ((top_left == s) & (bottom_right == m))
+    rising_diagonal = ((bottom_left == m) & (top_right == s)) | ((bottom_left == s) & (top_right == m))
+    return int(np.count_nonzero((centre == a) & falling_diagonal & rising_diagonal))
+
 def part_two(filename: Path) -> int:
+    grid = ingest_grid(filename)
+    return count_x_mas(grid)
+
+def part_two_regex(filename: Path) -> int:
     horizontal_line_list = ingest_data(filename)
     vertical_line_list = get_vertical_lines(horizontal_line_list)
 
@@ -168,6 +241,327 @@ def part_two(filename: Path) -> int:
 
     return answer
 
+@dataclass(frozen=True)
+class Stencil():
+    ''' A 2D pattern: the ASCII code each (row offset, col offset) cell must hold, relative to
+    the pattern's top-left corner.  Cells not listed are wildcards.'''
+    name: str
+    cells: tuple[tuple[int, int, int], ...]
+
+    @classmethod
+    def from_rows(cls, name: str, rows: list[str], wildcard: str = '.') -> 'Stencil':
+        cells = tuple((row_num, col_num, ord(char)) 
+                      for row_num, row in enumerate(rows) 
+                      for col_num, char in enumerate(row) if char != wildcard)
+        return cls(name, cells)
+
+    @property
+    def height(self) -> int:
+        return max(row_num for row_num, _, _ in self.cells) + 1
+
+    @property
+    def width(self) -> int:
+        return max(col_num for _, col_num, _ in self.cells) + 1
+
+X_MAS_STENCILS = [Stencil.from_rows('X-MAS (M left)', ['M.S', '.A.', 'M.S']),
+                  Stencil.from_rows('X-MAS (M right)', ['S.M', '.A.', 'S.M']),
+                  Stencil.from_rows('X-MAS (M top)', ['M.M', '.A.', 'S.S']),
+                  Stencil.from_rows('X-MAS (M bottom)', ['S.S', '.A.', 'M.M'])]
+
+
+@dataclass(frozen=True)
+class GridMatch():
+    pattern: str
+    row_num: int
+    col_num: int
+    direction: tuple[int, int] = (0, 0)
+
+
+class AhoCorasick():
+    ''' Multi-pattern automaton: one left-to-right pass over a line reports every occurrence of
+    every pattern.  Failure links are folded into a dense (states x 256) transition table, so
+    scanning is one lookup per byte; `scan_grid` does that lookup for every line of a grid
+    direction at once.'''
+    def __init__(self, patterns: list[bytes]):
+        self.patterns = patterns
+        trie: list[dict[int, int]] = [{}]
+        outputs: list[list[int]] = [[]]
+        for pattern_idx, pattern in enumerate(patterns):
+            state = 0
+            for byte in pattern:
+                if byte not in trie[state]:
+                    trie.append({})
+                    outputs.append([])
+                    trie[state][byte] = len(trie) - 1
+                state = trie[state][byte]
+            outputs[state].append(pattern_idx)
+
+        self.transitions: list[list[int]] = [[0] * 256 for _ in trie]
+        fail = [0] * len(trie)
+        queue: deque[int] = deque()
+        for byte, child in trie[0].items():
+            self.transitions[0][byte] = child
+            queue.append(child)
+        while queue:  # breadth-first, so a state's failure target is always finished first
+            state = queue.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            self.transitions[state] = self.transitions[fail[state]].copy()
+            for byte, child in trie[state].items():
+                fail[child] = self.transitions[fail[state]][byte]
+                self.transitions[state][byte] = child
+                queue.append(child)
+        self.outputs = outputs
+        self.table = np.array(self.transitions, dtype=np.int32)
+        self.output_matrix = np.zeros((len(trie), len(patterns)), dtype=np.int64)  # patterns ending at each state
+        for state, pattern_indices in enumerate(outputs):
+            for pattern_idx in pattern_indices:
+                self.output_matrix[state, pattern_idx] += 1
+        self.has_output = self.output_matrix.any(axis=1)
+
+    def scan(self, line: bytes) -> Iterator[tuple[int, int]]:
+        ''' Yield (index of the last byte, pattern index) for every match in `line`.'''
+        transitions = self.transitions
+        outputs = self.outputs
+        state = 0
+        for i, byte in enumerate(line):
+            state = transitions[state][byte]
+            if outputs[state]:
+                for pattern_idx in outputs[state]:
+                    yield (i, pattern_idx)
+
+    def scan_grid(self, grid: np.ndarray, direction: tuple[int, int], 
+                  locate: bool = False) -> tuple[np.ndarray, list[tuple[int, int, int]]]:
+        ''' Run the automaton along every line of `grid` in `direction` together: step t advances
+        all lines still at least t + 1 long with one fancy-indexed table lookup.  Returns the
+        number of matches per pattern and, if asked, (last row, last col, pattern index) of each.'''
+        start_rows, start_cols, lengths = line_starts(grid.shape, direction)
+        num_cols = grid.shape[1]
+        flat_grid = np.ascontiguousarray(grid).ravel()
+        flat_table = self.table.ravel()  # state * 256 + byte
+        cells = start_rows * num_cols + start_cols
+        cell_step = direction[0] * num_cols + direction[1]
+        states = np.zeros(len(lengths), dtype=np.int64)
+        visits = np.zeros(len(self.table), dtype=np.int64)
+        hits: list[tuple[int, int, int]] = []
+        for t in range(int(lengths[0]) if len(lengths) else 0):
+            num_active = int(np.searchsorted(-lengths, -t, side='left'))  # lines are longest first
+            active = states[:num_active]
+            active *= 256
+            active += flat_grid[cells[:num_active] + cell_step * t]
+            states[:num_active] = flat_table[active]
+            visits += np.bincount(states[:num_active], minlength=len(self.table))
+            if locate:
+                for line_idx in np.flatnonzero(self.has_output[states[:num_active]]):
+                    for pattern_idx in self.outputs[states[line_idx]]:
+                        row_num, col_num = divmod(int(cells[line_idx]) + cell_step * t, num_cols)
+                        hits.append((row_num, col_num, pattern_idx))
+        return (visits @ self.output_matrix, hits)
+
+
+def line_starts(shape: tuple[int, int], direction: tuple[int, int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    ''' Start row, start column and length of every maximal line through the grid in
+    `direction` (a row step of 0 or 1), longest first.'''
+    num_rows, num_cols = shape
+    row_step, col_step = direction
+    starts = set()
+    if row_step == 1:
+        starts.update((0, col_num) for col_num in range(num_cols))
+    if col_step == 1:
+        starts.update((row_num, 0) for row_num in range(num_rows))
+    if col_step == -1:
+        starts.update((row_num, num_cols - 1) for row_num in range(num_rows))
+
+    start_cells = np.array(sorted(starts), dtype=np.int64).reshape(-1, 2)
+    start_rows, start_cols = start_cells[:, 0], start_cells[:, 1]
+    unbounded = np.full(len(start_rows), num_rows + num_cols)
+    row_room = num_rows - start_rows if row_step else unbounded
+    col_room = {1: num_cols - start_cols, -1: start_cols + 1, 0: unbounded}[col_step]
+    lengths = np.minimum(row_room, col_room)
+    order = np.argsort(-lengths, kind='stable')
+    return (start_rows[order], start_cols[order], lengths[order])
+
+def search_words(grid: np.ndarray, words: list[str], locate: bool = False) -> tuple[dict[str, int], list[GridMatch]]:
+    ''' Count (and optionally locate) every word in all 8 directions.  One automaton holds every 
+    word plus its reverse, so each of the 4 line directions is scanned exactly once no matter 
+    how many words there are; a reversed-word hit is the word read in the opposite direction.
+    For a handful of words, one `count_word` per word is faster; the automaton's flat cost wins
+    from roughly 20 words on.'''
+    patterns = [word.encode() for word in words] + [word[::-1].encode() for word in words]
+    automaton = AhoCorasick(patterns)
+    counts = {word: 0 for word in words}
+    matches: list[GridMatch] = []
+
+    for direction in SCAN_DIRECTIONS:
+        row_step, col_step = direction
+        pattern_counts, hits = automaton.scan_grid(grid, direction, locate)
+        for pattern_idx, count in enumerate(pattern_counts.tolist()):
+            counts[words[pattern_idx % len(words)]] += count
+        for end_row, end_col, pattern_idx in hits:
+            word = words[pattern_idx % len(words)]
+            if pattern_idx < len(words):
+                span = len(word) - 1
+                matches.append(GridMatch(word, end_row - span * row_step, end_col - span * col_step, direction))
+            else:
+                matches.append(GridMatch(word, end_row, end_col, (-row_step, -col_step)))
+    return (counts, matches)
+
+def search_stencils(grid: np.ndarray, stencils: list[Stencil], locate: bool = False) -> tuple[dict[str, int], list[GridMatch]]:
+    ''' Count (and optionally locate, by top-left corner) every stencil.  Each stencil ANDs one
+    comparison per cell into its own result, so memory stays at two grid-sized masks however
+    many stencils there are.'''
+    num_rows, num_cols = grid.shape
+    counts: dict[str, int] = {}
+    matches: list[GridMatch] = []
+
+    for stencil in stencils:
+        out_rows = num_rows - stencil.height + 1
+        out_cols = num_cols - stencil.width + 1
+        if out_rows <= 0 or out_cols <= 0:
+            counts[stencil.name] = 0
+            continue
+        
+        found = np.ones((out_rows, out_cols), dtype=bool)
+        for row_offset, col_offset, char in stencil.cells:
+            found &= grid[row_offset:row_offset + out_rows, col_offset:col_offset + out_cols] == char
+
+        counts[stencil.name] = int(np.count_nonzero(found))
+        if locate:
+            matches.extend(GridMatch(stencil.name, int(row_num), int(col_num)) for row_num, col_num in np.argwhere(found))
+    return (counts, matches)
+
+
+@dataclass(frozen=True)
+class GridLayout():
+    ''' Where the rows of a word search file sit on disk.  Every row is `num_cols` characters
+    followed by the same terminator (b'\n' or b'\r\n'); the last row may lack it and blank lines
+    after it are ignored, like `ingest_grid` does.'''
+    num_rows: int
+    num_cols: int
+    terminator: bytes
+
+    @property
+    def line_length(self) -> int:
+        return self.num_cols + len(self.terminator)
+
+def find_content_end(f, file_size: int, block_size: int = 4096) -> int:
+    ''' Offset just past the last byte that isn't a trailing \r or \n, reading backwards.'''
+    end = file_size
+    while end > 0:
+        f.seek(max(0, end - block_size))
+        block = f.read(end - max(0, end - block_size))
+        stripped = block.rstrip(b'\r\n')
+        if stripped:
+            return end - len(block) + len(stripped)
+        end -= len(block)
+    return 0
+
+def get_grid_layout(filename: Path) -> GridLayout:
+    with open(filename, 'rb') as f:
+        first_line = f.readline()
+        num_cols = len(first_line.rstrip(b'\r\n'))
+        terminator = first_line[num_cols:] or b'\n'
+        content_end = find_content_end(f, os.path.getsize(filename))
+
+    if content_end == 0:
+        return GridLayout(0, num_cols, terminator)
+    num_rows, remainder = divmod(content_end + len(terminator), num_cols + len(terminator))
+    if remainder or num_cols == 0:
+        raise ValueError(f"{filename}: rows are not all {num_cols} characters followed by {terminator!r}")
+    return GridLayout(num_rows, num_cols, terminator)
+
+def read_band(filename: Path, start: int, stop: int) -> np.ndarray:
+    ''' Rows [start, stop) of the word search, read through a memory map.'''
+    layout = get_grid_layout(filename)
+    stop = min(stop, layout.num_rows)
+    if start >= stop:
+        return np.zeros((0, layout.num_cols), dtype=np.uint8)
+    terminator = np.frombuffer(layout.terminator, dtype=np.uint8)
+    flat = np.memmap(filename, dtype=np.uint8, mode='r')
+    band = np.array(flat[start * layout.line_length:stop * layout.line_length])
+    if band.size % layout.line_length:  # no terminator after the last row
+        band = np.concatenate([band, terminator])
+    band = band.reshape(-1, layout.line_length)
+    if (band[:, layout.num_cols:] != terminator).any():
+        raise ValueError(f"{filename}: rows {start}-{stop} are not all {layout.num_cols} characters wide")
+    return band[:, :layout.num_cols]
+
+def count_band(filename: Path, word: str, start: int, stop: int) -> int:
+    ''' Count the occurrences that start in rows [start, stop).  The band is read with a halo of
+    len(word) - 1 rows on each side, so words crossing the seam are seen in full, but each is
+    only counted by the band that owns its first letter.'''
+    halo = len(word) - 1
+    band_start = max(0, start - halo)
+    band = read_band(filename, band_start, stop + halo)
+    return count_word(band, word, start_rows=(start - band_start, stop - band_start))
+
+def count_rows(filename: Path) -> int:
+    return get_grid_layout(filename).num_rows
+
+def part_one_tiled(filename: Path, max_workers: int | None = None, tile_rows: int = TILE_ROWS, word: str = WORD_PART_ONE) -> int:
+    num_rows = count_rows(filename)
+    starts = list(range(0, num_rows, tile_rows))
+    stops = [min(start + tile_rows, num_rows) for start in starts]
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return sum(executor.map(count_band, [filename] * len(starts), [word] * len(starts), starts, stops))
+
+
+def write_random_grid(filename: Path, size: int) -> None:
+    rng = np.random.default_rng()
+    grid = rng.choice(np.frombuffer(b'XMAS', dtype=np.uint8), size=(size, size))
+    newlines = np.full((size, 1), ord('\n'), dtype=np.uint8)
+    with open(filename, 'wb') as f:
+        f.write(np.hstack((grid, newlines)).tobytes())
+
+def benchmark_part_one(sizes: tuple[int, ...] = (100, 500, 1_000, 10_000), filename: Path = Path('/tmp/day4_benchmark.txt')) -> None:
+    for size in sizes:
+        write_random_grid(filename, size)
+        grid_time = timeit.timeit(lambda: part_one(filename), number=1)
+        if size <= 500:  # the pandas/regex version takes minutes at 1000 x 1000
+            regex_time = timeit.timeit(lambda: part_one_regex(filename), number=1)
+            print(f"{size:>6} x {size:<6}  regex {regex_time:8.3f}s  |  uint8 grid {grid_time:8.3f}s")
+        else:
+            print(f"{size:>6} x {size:<6}  regex  (skipped)  |  uint8 grid {grid_time:8.3f}s")
+
+def benchmark_part_two(sizes: tuple[int, ...] = (100, 500, 1_000, 10_000), filename: Path = Path('/tmp/day4_benchmark.txt')) -> None:
+    for size in sizes:
+        write_random_grid(filename, size)
+        stencil_time = timeit.timeit(lambda: part_two(filename), number=1)
+        if size <= 1_000:
+            regex_time = timeit.timeit(lambda: part_two_regex(filename), number=1)
+            print(f"{size:>6} x {size:<6}  regex {regex_time:8.3f}s  |  stencil {stencil_time:8.3f}s")
+        else:
+            print(f"{size:>6} x {size:<6}  regex  (skipped)  |  stencil {stencil_time:8.3f}s")
+
+def random_words(num_words: int, min_length: int = 3, max_length: int = 6) -> list[str]:
+    rng = np.random.default_rng()
+    return list({''.join(rng.choice(list('XMAS'), size=rng.integers(min_length, max_length + 1))) for _ in range(num_words)})
+
+def benchmark_search(size: int = 500, word_counts: tuple[int, ...] = (1, 10, 50), filename: Path = Path('/tmp/day4_benchmark.txt')) -> None:
+    ''' The automaton against one `count_word` call per word, and the X-MAS stencils against
+    `count_x_mas`.'''
+    write_random_grid(filename, size)
+    grid = ingest_grid(filename)
+    for num_words in word_counts:
+        words = [WORD_PART_ONE] if num_words == 1 else random_words(num_words)
+        automaton_time = timeit.timeit(lambda: search_words(grid, words), number=1)
+        per_word_time = timeit.timeit(lambda: [count_word(grid, word) for word in words], number=1)
+        print(f"{size} x {size}, {len(words):>3} words:  automaton {automaton_time:.3f}s  |  count_word per word {per_word_time:.3f}s")
+    stencil_counts, _ = search_stencils(grid, X_MAS_STENCILS)
+    assert sum(stencil_counts.values()) == count_x_mas(grid)
+    stencil_time = timeit.timeit(lambda: search_stencils(grid, X_MAS_STENCILS), number=1)
+    x_mas_time = timeit.timeit(lambda: count_x_mas(grid), number=1)
+    print(f"{size} x {size}, X-MAS:  search_stencils {stencil_time:.3f}s  |  count_x_mas {x_mas_time:.3f}s")
+
+def benchmark_tiled(size: int = 10_000, worker_counts: tuple[int, ...] = (1, 2, 4, 8), tile_rows: int = TILE_ROWS,
+                    filename: Path = Path('/tmp/day4_benchmark.txt')) -> None:
+    write_random_grid(filename, size)
+    single_time = timeit.timeit(lambda: part_one(filename), number=1)
+    print(f"{size} x {size} single process:  {single_time:.3f}s")
+    for max_workers in worker_counts:
+        tiled_time = timeit.timeit(lambda: part_one_tiled(filename, max_workers, tile_rows), number=1)
+        print(f"{size} x {size} with {max_workers} workers:  {tiled_time:.3f}s")
+
 def main():
     print(f"Part One (example):  {part_one(EXAMPLE)}")
     print(f"Part One (input):  {part_one(INPUT)}")  # 2100 is too low!  2946 is too high!  2943 is too high!  2543 is correct!
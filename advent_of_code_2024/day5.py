@@ -91,11 +91,23 @@ After taking only the incorrectly-ordered updates and ordering them correctly, t
 Find the updates which are not in the correct order. What do you get if you add up the middle page numbers after correctly ordering just those updates?
 '''
 
+import hashlib
+import itertools
+import json
+import os
+import random
+import timeit
+from collections import defaultdict, deque
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Callable, TextIO
 from advent_of_code_2024.constants import DATA_DIR
 
 EXAMPLE = DATA_DIR / 'day5_example.txt'
 INPUT = DATA_DIR / 'day5_input.txt'
+RULE_CACHE_DIR = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'advent_of_code_2024' / 'day5'
                 
 def get_ordering_rules(filename: Path) -> list[tuple[int, int]]:
     with open(filename, 'r') as f:
@@ -117,6 +129,67 @@ def get_page_updates(filename: Path) -> list[list[int]]:
     return page_updates
 
 
+@dataclass
+class RuleIndex():
+    ''' The ordering rules indexed once, instead of re-filtering the whole rule list per update.
+    `successors` maps each page to the pages that must come after it.'''
+    successors: defaultdict[int, set[int]] = field(default_factory=lambda: defaultdict(set))
+
+    @classmethod
+    def from_rules(cls, ordering_rules: list[tuple[int, int]]) -> 'RuleIndex':
+        index = cls()
+        for earlier, later in ordering_rules:
+            index.add_rule(earlier, later)
+        return index
+
+    def add_rule(self, earlier: int, later: int) -> None:
+        self.successors[earlier].add(later)
+
+    def validate(self, update: list[int]) -> bool:
+        ''' One pass over the update: a page is out of order if any page it must precede was
+        already printed.'''
+        printed: set[int] = set()
+        successors = self.successors
+        for page in update:
+            if page in successors and not successors[page].isdisjoint(printed):
+                return False
+            printed.add(page)
+        return True
+
+
+def parse_update(line: str) -> list[int]:
+    return list(map(int, line.split(',')))
+
+def read_rules(f: TextIO) -> tuple[RuleIndex, str | None]:
+    ''' Consume the `|` section of an open print queue file.  Also returns the first update
+    line, which has to be read to know the section is over.'''
+    rule_index = RuleIndex()
+    for line in f:
+        line = line.strip()
+        if '|' in line:
+            earlier, later = line.split('|')
+            rule_index.add_rule(int(earlier), int(later))
+        elif line:
+            return (rule_index, line)
+    return (rule_index, None)
+
+def read_updates(f: TextIO, first_update: str | None) -> Iterator[list[int]]:
+    pending = [first_update] if first_update is not None else []
+    for line in itertools.chain(pending, f):
+        line = line.strip()
+        if line:
+            yield parse_update(line)
+
+@contextmanager
+def stream_print_queue(filename: Path) -> Iterator[tuple[RuleIndex, Iterator[list[int]]]]:
+    ''' Read the file once: the `|` section is consumed up front into a `RuleIndex`, and the
+    updates are then parsed lazily from the same handle, one line at a time.  The handle is
+    closed when the `with` block exits, however far the updates were read.'''
+    with open(filename, 'r') as f:
+        rule_index, first_update = read_rules(f)
+        yield (rule_index, read_updates(f, first_update))
+
+
 def validate_update(ordering_rules: list[tuple[int, int]], update: list[int]) -> bool:      
     applicable_rules = [rule for rule in ordering_rules if rule[0] in update and rule[1] in update]
 
@@ -130,24 +203,147 @@ def validate_update(ordering_rules: list[tuple[int, int]], update: list[int]) ->
     return True
 
 
-def fix_invalid_update(ordering_rules: list[tuple[int, int]], update: list[int]) -> list[int]:
-    applicable_rules = [rule for rule in ordering_rules if rule[0] in update and rule[1] in update]
-
-    for rule in applicable_rules:
-        first_page = rule[0]
-        first_page_idx = update.index(first_page)
-        second_page = rule[1]
-        second_page_idx = update.index(second_page)
-
-        if second_page_idx < first_page_idx:
-            update.remove(second_page)
-            update.insert(len(update), second_page)
-
-    if validate_update(ordering_rules, update):
-        return update
-
-    else:  
-        return fix_invalid_update(ordering_rules, update)
+class RuleCycle(Exception):
+    ...
+
+
+def fix_invalid_update(rule_index: RuleIndex, update: list[int]) -> list[int]:
+    ''' Kahn's topological sort over the rules between the update's own pages: O(k + e) for k
+    pages and e applicable rules.  Raises `RuleCycle` if those rules can't all be satisfied.'''
+    pages = set(update)
+    in_degree = {page: 0 for page in update}
+    edges: dict[int, set[int]] = {}
+    for page in update:
+        edges[page] = rule_index.successors.get(page, set()) & pages
+        for later in edges[page]:
+            in_degree[later] += 1
+
+    ready = deque(page for page in update if in_degree[page] == 0)
+    fixed_update = []
+    while ready:
+        page = ready.popleft()
+        fixed_update.append(page)
+        for later in edges[page]:
+            in_degree[later] -= 1
+            if in_degree[later] == 0:
+                ready.append(later)
+
+    if len(fixed_update) < len(in_degree):
+        stuck = [page for page in update if in_degree[page] > 0]
+        raise RuleCycle(f"Ordering rules contain a cycle among pages {stuck}")
+    return fixed_update
+
+
+@dataclass
+class RuleBitsets():
+    ''' The ordering rules as Python ints used as bitsets over the pages, numbered by position in
+    `pages`.  Bit j of `successors[i]` is set by a rule pages[i]|pages[j].  Bit j of `reach[i]`
+    is set if pages[i] must precede pages[j] through a chain of rules, i.e. the transitive
+    closure.
+
+    `validate` and `repair` only use the direct rules between the update's own pages, like the
+    puzzle and `RuleIndex`, so they also work when the full rule set is cyclic.  `precedes`
+    answers chain queries from the closure.'''
+    pages: list[int]
+    successors: list[int]
+    reach: list[int]
+
+    def __post_init__(self):
+        self.bit_of = {page: i for i, page in enumerate(self.pages)}
+        self.predecessors = [0] * len(self.pages)
+        for i, row in enumerate(self.successors):
+            while row:
+                j = (row & -row).bit_length() - 1
+                self.predecessors[j] |= 1 << i
+                row &= row - 1
+        self.has_cycles = any(row >> i & 1 for i, row in enumerate(self.reach))  # some page must precede itself
+
+    @classmethod
+    def from_rules(cls, ordering_rules: list[tuple[int, int]]) -> 'RuleBitsets':
+        pages = sorted({page for rule in ordering_rules for page in rule})
+        bit_of = {page: i for i, page in enumerate(pages)}
+        successors = [0] * len(pages)
+        for earlier, later in ordering_rules:
+            successors[bit_of[earlier]] |= 1 << bit_of[later]
+
+        reach = successors.copy()
+        for k in range(len(pages)):  # Warshall's algorithm, one whole row per OR
+            k_bit = 1 << k
+            k_row = reach[k]
+            for i in range(len(pages)):
+                if reach[i] & k_bit:
+                    reach[i] |= k_row
+        return cls(pages, successors, reach)
+
+    def mask(self, update: list[int]) -> int:
+        return sum(1 << self.bit_of[page] for page in set(update) if page in self.bit_of)
+
+    def precedes(self, first_page: int, second_page: int) -> bool:
+        ''' True if `first_page` must come before `second_page` through some chain of rules.'''
+        if first_page not in self.bit_of or second_page not in self.bit_of:
+            return False
+        return bool(self.reach[self.bit_of[first_page]] >> self.bit_of[second_page] & 1)
+
+    def validate(self, update: list[int]) -> bool:
+        ''' Same answer as `RuleIndex.validate`: a page is out of order if any page it must
+        precede was already printed, tested with one AND per page.'''
+        printed = 0
+        for page in update:
+            bit = self.bit_of.get(page)
+            if bit is None:
+                continue
+            if self.successors[bit] & printed:
+                return False
+            printed |= 1 << bit
+        return True
+
+    def repair(self, update: list[int]) -> list[int]:
+        ''' Kahn's algorithm on bitmasks: repeatedly take the first remaining page that no other
+        remaining page must precede.  O(k^2) ANDs for k pages.  Raises `RuleCycle` if the rules
+        between the update's pages can't all be satisfied.'''
+        remaining = list(update)
+        remaining_mask = self.mask(update)
+        fixed_update = []
+        while remaining:
+            for position, page in enumerate(remaining):
+                bit = self.bit_of.get(page)
+                if bit is None or not self.predecessors[bit] & remaining_mask:
+                    break
+            else:
+                raise RuleCycle(f"Ordering rules contain a cycle among pages {remaining}")
+            fixed_update.append(remaining.pop(position))
+            if bit is not None:
+                remaining_mask &= ~(1 << bit)
+        return fixed_update
+
+    def save(self, filename: Path) -> None:
+        with open(filename, 'w') as f:
+            json.dump({'pages': self.pages,
+                       'successors': [format(row, 'x') for row in self.successors],
+                       'reach': [format(row, 'x') for row in self.reach]}, f)
+
+    @classmethod
+    def load(cls, filename: Path) -> 'RuleBitsets':
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        return cls(data['pages'], [int(row, 16) for row in data['successors']], [int(row, 16) for row in data['reach']])
+
+
+def hash_rules(ordering_rules: list[tuple[int, int]]) -> str:
+    rules_text = '\n'.join(f"{earlier}|{later}" for earlier, later in sorted(set(ordering_rules)))
+    return hashlib.sha256(rules_text.encode()).hexdigest()
+
+def load_or_build_rule_bitsets(ordering_rules: list[tuple[int, int]], cache_dir: Path = RULE_CACHE_DIR) -> RuleBitsets:
+    ''' The bitsets are cached on disk under the hash of the rule set, so repeated runs against
+    the same rules skip the O(pages^2) closure build.'''
+    cache_file = cache_dir / f"{hash_rules(ordering_rules)}.json"
+    if cache_file.exists():
+        return RuleBitsets.load(cache_file)
+    
+    rule_bitsets = RuleBitsets.from_rules(ordering_rules)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    rule_bitsets.save(cache_file)
+    return rule_bitsets
 
 
 def find_middle_page_num(update: list[int]) -> int:
@@ -155,24 +351,60 @@ def find_middle_page_num(update: list[int]) -> int:
     return update[middle_idx]
 
 
-def part_one(filename: Path) -> int:
-    ordering_rules = get_ordering_rules(filename)
-    page_updates = get_page_updates(filename)
-    valid_updates = [update for update in page_updates if validate_update(ordering_rules, update)]
-    answer = sum(find_middle_page_num(update) for update in valid_updates)
-    
-    return answer
-
-
-def part_two(filename: Path) -> int:
-    ordering_rules = get_ordering_rules(filename)
-    page_updates = get_page_updates(filename)
-    invalid_updates = [update for update in page_updates if not validate_update(ordering_rules, update)]
-    fixed_updates = [fix_invalid_update(ordering_rules, update) for update in invalid_updates]
-    answer = sum(find_middle_page_num(update) for update in fixed_updates)
-    
-    return answer
-
+def select_engine(rule_index: RuleIndex, engine: str) -> tuple[Callable[[list[int]], bool], Callable[[list[int]], list[int]]]:
+    ''' (validate, repair) for `engine`: 'index' for the `RuleIndex` sets, 'bitset' for the
+    (cached) `RuleBitsets`.'''
+    if engine == 'bitset':
+        ordering_rules = [(earlier, later) for earlier, successors in rule_index.successors.items() for later in successors]
+        rule_bitsets = load_or_build_rule_bitsets(ordering_rules)
+        return (rule_bitsets.validate, rule_bitsets.repair)
+    elif engine == 'index':
+        return (rule_index.validate, lambda update: fix_invalid_update(rule_index, update))
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def part_one(filename: Path, engine: str = 'index') -> int:
+    with stream_print_queue(filename) as (rule_index, page_updates):
+        validate, _ = select_engine(rule_index, engine)
+        return sum(find_middle_page_num(update) for update in page_updates if validate(update))
+
+
+def part_two(filename: Path, engine: str = 'index') -> int:
+    with stream_print_queue(filename) as (rule_index, page_updates):
+        validate, repair = select_engine(rule_index, engine)
+        return sum(find_middle_page_num(repair(update)) for update in page_updates if not validate(update))
+
+
+def random_rules_and_updates(num_rules: int, num_updates: int, num_pages: int = 1_000,
+                             update_length: int = 23) -> tuple[list[tuple[int, int]], list[list[int]]]:
+    ''' Rules consistent with a hidden page order (so there are no cycles) and updates of
+    distinct pages in random order.'''
+    page_order = random.sample(range(10, 10 + num_pages), num_pages)
+    rules = set()
+    while len(rules) < num_rules:
+        i, j = sorted(random.sample(range(num_pages), 2))
+        rules.add((page_order[i], page_order[j]))
+    updates = [random.sample(page_order, update_length) for _ in range(num_updates)]
+    return (list(rules), updates)
+
+def benchmark_validation(num_rules: int = 10**5, num_updates: int = 10**5, original_sample: int = 20) -> None:
+    ''' The original `validate_update` rescans every rule per update, so it's only timed on a
+    small sample of updates and extrapolated.'''
+    ordering_rules, page_updates = random_rules_and_updates(num_rules, num_updates)
+
+    def validate_with_index() -> list[bool]:
+        rule_index = RuleIndex.from_rules(ordering_rules)
+        return [rule_index.validate(update) for update in page_updates]
+
+    def validate_with_bitsets() -> list[bool]:
+        rule_bitsets = RuleBitsets.from_rules(ordering_rules)
+        return [rule_bitsets.validate(update) for update in page_updates]
+
+    index_time = timeit.timeit(validate_with_index, number=1)
+    bitset_time = timeit.timeit(validate_with_bitsets, number=1)
+    sample_time = timeit.timeit(lambda: [validate_update(ordering_rules, update) for update in page_updates[:original_sample]], number=1)
+    print(f"{num_rules:,} rules, {num_updates:,} updates:  RuleIndex {index_time:.3f}s  |  RuleBitsets {bitset_time:.3f}s  |  "
+          f"original ~{sample_time * num_updates / original_sample:,.0f}s (extrapolated from {original_sample})")
 
 def main():
     print(f"Part One (example):  {part_one(EXAMPLE)}") # should be 143
@@ -181,6 +413,8 @@ def main():
     print(f"Part Two (example):  {part_two(EXAMPLE)}") # should be 123
     print(f"Part Two (input):  {part_two(INPUT)}") # 6897
 
+    # benchmark_validation()
+
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
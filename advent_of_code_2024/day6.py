@@ -189,18 +189,27 @@ You need to get the guard stuck in a loop by adding a single new obstruction. Ho
 '''
 
 import datetime as dt
+import functools
+import timeit
 from pathlib import Path
 from rich import print
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from copy import deepcopy
 from typing import NamedTuple, Optional
 from enum import Enum
 from dataclasses import dataclass, field
+import numpy as np
 from alive_progress import alive_it
 from advent_of_code_2024.constants import DATA_DIR
 
 EXAMPLE = DATA_DIR / 'day6_example.txt'
 INPUT = DATA_DIR / 'day6_input.txt'
 
+GUARD_CHARS = {'^': 0, '>': 1, 'v': 2, '<': 3}  # matches Direction values
+STEPS = [(-1, 0), (0, 1), (1, 0), (0, -1)]  # (row step, col step) for each Direction value
+TRIAL_CHUNK_SIZE = 256
+
 class Point(NamedTuple):
     col: int
     row: int
@@ -369,14 +378,224 @@ def find_loops(first_guard: Guard, points_to_check: list[Point]) -> int:
     return total
 
 
-def part_one(filename: Path) -> int:
+def steps_to_obstacle_rightward(obstacles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    ''' For every cell: how many free cells lie to its right before the next obstacle (or the
+    edge), and whether it's an obstacle (True) or the edge (False) that ends the run.'''
+    num_cols = obstacles.shape[1]
+    cols = np.arange(num_cols)
+    obstacle_cols = np.where(obstacles, cols, num_cols)
+    next_at_or_after = np.minimum.accumulate(obstacle_cols[:, ::-1], axis=1)[:, ::-1]
+    next_after = np.hstack((next_at_or_after[:, 1:], np.full((obstacles.shape[0], 1), num_cols)))
+    blocked = next_after < num_cols
+    distance = np.where(blocked, next_after - cols - 1, num_cols - cols - 1)
+    return (distance, blocked)
+
+
+@dataclass
+class JumpMap():
+    ''' The lab as a uint8 array (1 = obstacle) plus, for every cell and direction, how far the
+    guard walks before she has to turn or leaves the map -- so she jumps from turn to turn
+    instead of stepping one cell at a time.'''
+    grid: np.ndarray
+    start: tuple[int, int]
+    start_direction: int
+    distance: np.ndarray = field(init=False, repr=False)  # (4, rows, cols)
+    blocked: np.ndarray = field(init=False, repr=False)   # (4, rows, cols)
+
+    def __post_init__(self):
+        obstacles = self.grid.astype(bool)
+        runs = [
+            tuple(a.T[::-1, :] for a in steps_to_obstacle_rightward(obstacles[::-1, :].T)),  # UP
+            steps_to_obstacle_rightward(obstacles),                                           # RIGHT
+            tuple(a.T for a in steps_to_obstacle_rightward(obstacles.T)),                     # DOWN
+            tuple(a[:, ::-1] for a in steps_to_obstacle_rightward(obstacles[:, ::-1])),      # LEFT
+        ]
+        self.distance = np.stack([distance for distance, _ in runs]).astype(np.int32)
+        self.blocked = np.stack([blocked for _, blocked in runs])
+
+    @classmethod
+    def from_file(cls, filename: Path) -> 'JumpMap':
+        with open(filename, 'rb') as f:
+            lines = f.read().split()
+        chars = np.array([np.frombuffer(line, dtype=np.uint8) for line in lines])
+        guard_cells = np.argwhere(np.isin(chars, np.frombuffer(b'^>v<', dtype=np.uint8)))
+        if len(guard_cells) == 0:
+            raise ValueError("Could not find a guard position in map.")
+        row_num, col_num = (int(x) for x in guard_cells[0])
+        grid = (chars == ord('#')).astype(np.uint8)
+        return cls(grid, (row_num, col_num), GUARD_CHARS[chr(chars[row_num, col_num])])
+
+    def next_stop(self, row_num: int, col_num: int, direction: int, 
+                  extra_obstacle: tuple[int, int] | None = None) -> tuple[int, int, bool]:
+        ''' Where the guard ends up walking straight from (row, col), and whether she stopped at
+        an obstacle (True) or walked off the map (False).  `extra_obstacle` is overlaid on the
+        precomputed tables without modifying them.'''
+        distance = int(self.distance[direction, row_num, col_num])
+        blocked = bool(self.blocked[direction, row_num, col_num])
+        row_step, col_step = STEPS[direction]
+        
+        if extra_obstacle is not None:
+            extra_row, extra_col = extra_obstacle
+            if row_step == 0 and extra_row == row_num:
+                steps = (extra_col - col_num) * col_step
+            elif col_step == 0 and extra_col == col_num:
+                steps = (extra_row - row_num) * row_step
+            else:
+                steps = 0
+            if 1 <= steps <= distance:
+                distance, blocked = steps - 1, True
+            
+        return (row_num + row_step * distance, col_num + col_step * distance, blocked)
+
+    def patrol(self) -> np.ndarray:
+        ''' Boolean map of every cell the guard visits before leaving.'''
+        visited = np.zeros(self.grid.shape, dtype=bool)
+        row_num, col_num = self.start
+        direction = self.start_direction
+        seen_turns: set[tuple[int, int, int]] = set()
+        while True:
+            stop_row, stop_col, blocked = self.next_stop(row_num, col_num, direction)
+            visited[min(row_num, stop_row):max(row_num, stop_row) + 1, 
+                    min(col_num, stop_col):max(col_num, stop_col) + 1] = True
+            if not blocked:
+                return visited
+            if (stop_row, stop_col, direction) in seen_turns:
+                raise InfiniteLoop
+            seen_turns.add((stop_row, stop_col, direction))
+            row_num, col_num, direction = stop_row, stop_col, (direction + 1) % 4
+
+    @functools.cached_property
+    def flat_tables(self) -> tuple[list[int], list[bool]]:
+        ''' The jump tables as flat Python lists, indexed (direction * rows + row) * cols + col;
+        scalar lookups on these are much cheaper than on the NumPy arrays.'''
+        return (self.distance.ravel().tolist(), self.blocked.ravel().tolist())
+
+    def first_visits(self) -> list[tuple[int, int, int, int, int]]:
+        ''' Every cell on the original path except the start, in the order the guard first
+        reaches it, as (row, col, previous row, previous col, direction when entering).'''
+        visits = []
+        seen_cells = {self.start}
+        seen_turns: set[tuple[int, int, int]] = set()
+        row_num, col_num = self.start
+        direction = self.start_direction
+        while True:
+            stop_row, stop_col, blocked = self.next_stop(row_num, col_num, direction)
+            row_step, col_step = STEPS[direction]
+            for steps in range(1, abs(stop_row - row_num) + abs(stop_col - col_num) + 1):
+                cell = (row_num + row_step * steps, col_num + col_step * steps)
+                if cell not in seen_cells:
+                    seen_cells.add(cell)
+                    visits.append((*cell, cell[0] - row_step, cell[1] - col_step, direction))
+            if not blocked:
+                return visits
+            if (stop_row, stop_col, direction) in seen_turns:
+                raise InfiniteLoop
+            seen_turns.add((stop_row, stop_col, direction))
+            row_num, col_num, direction = stop_row, stop_col, (direction + 1) % 4
+
+    def is_loop(self, extra_obstacle: tuple[int, int], start: tuple[int, int, int] | None = None,
+                turn_stamps: list[int] | defaultdict[int, int] | None = None, stamp: int = 1) -> bool:
+        ''' Does the guard get stuck with `extra_obstacle` overlaid on the shared map?  She starts
+        at `start` (row, col, direction), by default her original position.  A (cell, direction) 
+        turn state counts as seen when its entry in `turn_stamps` equals `stamp`, so callers can 
+        reuse one preallocated array across trials by bumping the stamp instead of clearing it.'''
+        num_rows, num_cols = self.grid.shape
+        distance_flat, blocked_flat = self.flat_tables
+        if turn_stamps is None:
+            turn_stamps = defaultdict(int)
+        row_num, col_num, direction = start if start is not None else (*self.start, self.start_direction)
+        extra_row, extra_col = extra_obstacle
+
+        while True:
+            idx = (direction * num_rows + row_num) * num_cols + col_num
+            distance = distance_flat[idx]
+            row_step, col_step = STEPS[direction]
+            if row_step == 0 and extra_row == row_num:
+                steps = (extra_col - col_num) * col_step
+            elif col_step == 0 and extra_col == col_num:
+                steps = (extra_row - row_num) * row_step
+            else:
+                steps = 0
+
+            if 1 <= steps <= distance:
+                distance = steps - 1
+            elif not blocked_flat[idx]:
+                return False
+
+            row_num += row_step * distance
+            col_num += col_step * distance
+            state = (direction * num_rows + row_num) * num_cols + col_num
+            if turn_stamps[state] == stamp:
+                return True
+            turn_stamps[state] = stamp
+            direction = (direction + 1) % 4
+
+    def find_loop_obstructions(self) -> list[tuple[int, int]]:
+        ''' The guard's walk up to the moment she first steps onto a candidate cell doesn't depend
+        on whether that cell is blocked, so each trial starts right there instead of from the
+        start position, and all trials share one turn-state array.'''
+        turn_stamps = [0] * self.distance.size
+        obstructions = []
+        for stamp, (row_num, col_num, prev_row, prev_col, direction) in enumerate(self.first_visits(), start=1):
+            if self.is_loop((row_num, col_num), (prev_row, prev_col, direction), turn_stamps, stamp):
+                obstructions.append((row_num, col_num))
+        return obstructions
+
+
+WORKER_STATE: dict = {}  # per-process map and turn-state array for the parallel obstruction search
+
+def init_obstruction_worker(grid: np.ndarray, start: tuple[int, int], start_direction: int) -> None:
+    ''' Runs once per worker process: the base map is shipped and its jump tables built once,
+    not per task.'''
+    jump_map = JumpMap(grid, start, start_direction)
+    WORKER_STATE['jump_map'] = jump_map
+    WORKER_STATE['turn_stamps'] = [0] * jump_map.distance.size
+    WORKER_STATE['stamp'] = 0
+
+def check_obstruction_chunk(visits: list[tuple[int, int, int, int, int]]) -> list[tuple[int, int]]:
+    jump_map: JumpMap = WORKER_STATE['jump_map']
+    obstructions = []
+    for row_num, col_num, prev_row, prev_col, direction in visits:
+        WORKER_STATE['stamp'] += 1
+        if jump_map.is_loop((row_num, col_num), (prev_row, prev_col, direction), 
+                            WORKER_STATE['turn_stamps'], WORKER_STATE['stamp']):
+            obstructions.append((row_num, col_num))
+    return obstructions
+
+def find_loop_obstructions_parallel(jump_map: JumpMap, max_workers: int | None = None, 
+                                    chunk_size: int = TRIAL_CHUNK_SIZE) -> list[tuple[int, int]]:
+    ''' Same result (and order) as `JumpMap.find_loop_obstructions`, with the candidate cells
+    split into chunks across a process pool.'''
+    visits = jump_map.first_visits()
+    chunks = [visits[i:i + chunk_size] for i in range(0, len(visits), chunk_size)]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_obstruction_worker,
+                             initargs=(jump_map.grid, jump_map.start, jump_map.start_direction)) as executor:
+        return [cell for chunk_result in executor.map(check_obstruction_chunk, chunks) for cell in chunk_result]
+
+
+def part_one_original(filename: Path) -> int:
     map = create_map(filename)
     guard = find_guard(map)
     answer = guard.patrol()
     return answer
 
 
+def part_one(filename: Path) -> int:
+    jump_map = JumpMap.from_file(filename)
+    return int(jump_map.patrol().sum())
+
+
 def part_two(filename: Path) -> int:
+    jump_map = JumpMap.from_file(filename)
+    return len(jump_map.find_loop_obstructions())
+
+
+def part_two_parallel(filename: Path, max_workers: int | None = None, chunk_size: int = TRIAL_CHUNK_SIZE) -> int:
+    jump_map = JumpMap.from_file(filename)
+    return len(find_loop_obstructions_parallel(jump_map, max_workers, chunk_size))
+
+
+def part_two_original(filename: Path) -> int:
     map = create_map(filename)
     guard = find_guard(map)
     guard.patrol()
@@ -386,6 +605,45 @@ def part_two(filename: Path) -> int:
     return answer
 
 
+def write_random_map(filename: Path, size: int, obstacle_density: float = 0.02) -> None:
+    ''' Random map with the guard in the middle, re-rolled until she actually leaves it.'''
+    rng = np.random.default_rng()
+    while True:
+        chars = np.where(rng.random((size, size)) < obstacle_density, ord('#'), ord('.')).astype(np.uint8)
+        chars[size // 2, size // 2] = ord('^')
+        try:
+            JumpMap((chars == ord('#')).astype(np.uint8), (size // 2, size // 2), 0).patrol()
+            break
+        except InfiniteLoop:
+            continue
+    with open(filename, 'wb') as f:
+        f.write(b''.join(row.tobytes() + b'\n' for row in chars))
+
+def benchmark_jump_map(size: int = 1_000, filename: Path = Path('/tmp/day6_benchmark.txt')) -> None:
+    ''' The original part two deep-copies the whole map per candidate, so at this size only part
+    one is timed against it.'''
+    write_random_map(filename, size)
+    original_time = timeit.timeit(lambda: part_one_original(filename), number=1)
+    part_one_time = timeit.timeit(lambda: part_one(filename), number=1)
+    part_two_time = timeit.timeit(lambda: part_two(filename), number=1)
+    print(f"{size} x {size}:  part one original {original_time:.3f}s  |  jump map {part_one_time:.3f}s  |  "
+          f"part two jump map {part_two_time:.3f}s")
+
+def benchmark_obstruction_trials(size: int = 60, filename: Path = Path('/tmp/day6_benchmark.txt')) -> None:
+    write_random_map(filename, size)
+    original_time = timeit.timeit(lambda: part_two_original(filename), number=1)
+    trials_time = timeit.timeit(lambda: part_two(filename), number=1)
+    print(f"{size} x {size} part two:  deepcopy per candidate {original_time:.3f}s  |  shared map trials {trials_time:.4f}s")
+
+def benchmark_parallel_trials(size: int = 1_000, worker_counts: tuple[int, ...] = (1, 2, 4, 8),
+                              chunk_size: int = TRIAL_CHUNK_SIZE, filename: Path = Path('/tmp/day6_benchmark.txt')) -> None:
+    write_random_map(filename, size, obstacle_density=0.005)
+    serial_time = timeit.timeit(lambda: part_two(filename), number=1)
+    print(f"{size} x {size} part two, serial:  {serial_time:.3f}s")
+    for max_workers in worker_counts:
+        parallel_time = timeit.timeit(lambda: part_two_parallel(filename, max_workers, chunk_size), number=1)
+        print(f"{size} x {size} part two, {max_workers} workers:  {parallel_time:.3f}s  ({serial_time / parallel_time:.1f}x)")
+
 def main():
     print(f"Part One (example):  {part_one(EXAMPLE)}") # should be 41
     print(f"Part One (input):  {part_one(INPUT)}") # 5162
@@ -56,29 +56,110 @@ from pathlib import Path
 from rich import print
 from copy import deepcopy
 import itertools
+import os
+import random
+import timeit
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator
 from alive_progress import alive_it
 from advent_of_code_2024.constants import DATA_DIR
 
 EXAMPLE = DATA_DIR / 'day7_example.txt'
 INPUT = DATA_DIR / 'day7_input.txt'
 
-OPERATORS_PART_ONE = ['+', '*']
-OPERATORS_PART_TWO = ['+', '*', '||']
+DIGIT_TABLE_SIZE = 10_000
+DIGIT_POWERS = [10 ** len(str(n)) for n in range(DIGIT_TABLE_SIZE)]
+
+def digit_power(n: int) -> int:
+    ''' The power of ten that shifts a number left by `n`'s digit count, i.e. 10 ** len(str(n)).'''
+    if n < DIGIT_TABLE_SIZE:
+        return DIGIT_POWERS[n]
+    power = DIGIT_TABLE_SIZE * 10
+    while power <= n:
+        power *= 10
+    return power
+
+def concatenate(num_1: int, num_2: int) -> int:
+    return num_1 * (DIGIT_POWERS[num_2] if num_2 < DIGIT_TABLE_SIZE else digit_power(num_2)) + num_2
+
+def split_concatenation(result: int, num_2: int) -> int | None:
+    power = DIGIT_POWERS[num_2] if num_2 < DIGIT_TABLE_SIZE else digit_power(num_2)
+    if result >= num_2 and (result - num_2) % power == 0:
+        return (result - num_2) // power
+    return None
+
+def split_sum(result: int, num_2: int) -> int | None:
+    return result - num_2 if result >= num_2 else None
+
+def split_product(result: int, num_2: int) -> int | None:
+    if num_2 != 0 and result % num_2 == 0:
+        return result // num_2
+    return None
+
+@dataclass(frozen=True)
+class Operator():
+    ''' `forward` combines the running value with the next number.  `inverse` recovers the running
+    value from a result and the last number (None if it can't have come from this operator);
+    operators without one are only solved forwards.  `absorbing` is an operand that makes the
+    result independent of the left side (0 for `*`), which no inverse can undo.  `monotone` means
+    the result is never smaller than the left side for positive operands, so forward search can
+    prune on the target; it's opt-in, since a wrong claim silently drops valid answers.'''
+    symbol: str
+    forward: Callable[[int, int], int]
+    inverse: Callable[[int, int], int | None] | None = None
+    absorbing: int | None = None
+    monotone: bool = False
+
+    def __str__(self) -> str:
+        return self.symbol
+
+OPERATOR_REGISTRY: dict[str, Operator] = {}
+
+def register_operator(operator: Operator) -> Operator:
+    OPERATOR_REGISTRY[operator.symbol] = operator
+    return operator
+
+def select_operators(*symbols: str) -> list[Operator]:
+    try:
+        return [OPERATOR_REGISTRY[symbol] for symbol in symbols]
+    except KeyError as e:
+        raise ValueError(f"Unknown operator: {e.args[0]}") from None
+
+register_operator(Operator('+', lambda num_1, num_2: num_1 + num_2, split_sum, monotone=True))
+register_operator(Operator('*', lambda num_1, num_2: num_1 * num_2, split_product, absorbing=0, monotone=True))
+register_operator(Operator('||', concatenate, split_concatenation, monotone=True))
+
+OPERATORS_PART_ONE = select_operators('+', '*')
+OPERATORS_PART_TWO = select_operators('+', '*', '||')
+
+EQUATION_CHUNK_SIZE = 2_000
+MAX_FRONTIER = 1_000_000  # distinct partial values (~100 MB of ints) before the frontier solver gives up
+STREAM_WINDOW_CHUNKS = 8  # chunks read (and sorted longest-first) at a time when streaming
+
+def parse_equation(line: str) -> tuple[int, list[int]]:
+    test_value, numbers = line.strip('\n').split(':')
+    return int(test_value), [int(x) for x in numbers.split()]
 
 def ingest_data(filename: Path) -> list[tuple[int, list[int]]]:
     with open(filename, 'r') as f:
-        line_list = [line.strip('\n').split(':') for line in f.readlines()]
-        output_list = [(int(test_value), [int(x) for x in numbers.split()]) for test_value, numbers in line_list]
+        output_list = [parse_equation(line) for line in f.readlines()]
         
     return output_list
 
-def find_operator_combos(number_list: list[int], potential_operators: list[str]) -> list[list[str]]:
+def stream_equations(filename: Path) -> Iterator[tuple[int, list[int]]]:
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield parse_equation(line)
+
+def find_operator_combos(number_list: list[int], potential_operators: list[Operator]) -> list[list[Operator]]:
     num_gaps = len(number_list) - 1
     operator_combos = itertools.product(potential_operators, repeat=num_gaps)
     operator_combo_list = [list(x) for x in list(operator_combos)]
     return operator_combo_list
 
-def validate_equation(test_value: int, number_list: list[int], operator_combo_list: list[list[str]]) -> bool:
+def validate_equation(test_value: int, number_list: list[int], operator_combo_list: list[list[Operator]]) -> bool:
     for operator_list in operator_combo_list:
         result = parse_operator_list(deepcopy(number_list), deepcopy(operator_list))
         if result == test_value:
@@ -86,7 +167,7 @@ def validate_equation(test_value: int, number_list: list[int], operator_combo_li
 
     return False
         
-def parse_operator_list(number_list: list[int], operator_list: list[str]) -> int:
+def parse_operator_list(number_list: list[int], operator_list: list[Operator]) -> int:
     if len(number_list) == 1:
         return number_list[0]
 
@@ -97,14 +178,101 @@ def parse_operator_list(number_list: list[int], operator_list: list[str]) -> int
     number_list.insert(0, result)
     return parse_operator_list(number_list, operator_list)
 
-def perform_calculation(num_1: int, num_2: int, operator: str) -> int:
-    match operator:
-        case '+': return num_1 + num_2
-        case '*': return num_1 * num_2
-        case '||': return int(f"{num_1}{num_2}")
-        case _: raise ValueError
+def perform_calculation(num_1: int, num_2: int, operator: Operator) -> int:
+    return operator.forward(num_1, num_2)
     
-def find_calibration_result(filename: Path, operator_list: list[str]) -> int:
+def solve_backward(target: int, number_list: list[int], potential_operators: list[Operator], count: int | None = None) -> bool:
+    ''' Can the first `count` numbers produce `target`?  Works right-to-left, undoing the last
+    operator only where its inverse says that's possible (e.g. `*` only if the last number divides
+    the target).  Every operator needs an inverse.'''
+    steps = [(operator.inverse, operator.absorbing, operator.forward) for operator in potential_operators]
+
+    def undo(target: int, count: int) -> bool:
+        last = number_list[count - 1]
+        if count == 1:
+            return target == last
+        for inverse, absorbing, forward in steps:
+            if last == absorbing:
+                if target == forward(0, last):
+                    return True
+                continue
+            previous = inverse(target, last)
+            if previous is not None and undo(previous, count - 1):
+                return True
+        return False
+
+    return undo(target, len(number_list) if count is None else count)
+
+def pruning_start(number_list: list[int], potential_operators: list[Operator]) -> int | None:
+    ''' How many numbers must be consumed before partial values above the target can be dropped
+    (None if never).  Monotone operators only keep values from shrinking on positive operands;
+    a later zero (x * 0) can still bring an overshooting value back down.'''
+    if not all(operator.monotone for operator in potential_operators):
+        return None
+    return max((i + 1 for i, number in enumerate(number_list) if number <= 0), default=0)
+
+def solve_forward(target: int, number_list: list[int], potential_operators: list[Operator]) -> bool:
+    ''' Depth-first left-to-right search for operators without an inverse; partial values above
+    the target are dropped where `pruning_start` allows.'''
+    prune_from = pruning_start(number_list, potential_operators)
+    stack = [(number_list[0], 1)]
+    while stack:
+        value, index = stack.pop()
+        if index == len(number_list):
+            if value == target:
+                return True
+            continue
+        if prune_from is not None and index >= prune_from and value > target:
+            continue
+        for operator in potential_operators:
+            stack.append((operator.forward(value, number_list[index]), index + 1))
+    return False
+
+def is_solvable(target: int, number_list: list[int], potential_operators: list[Operator]) -> bool:
+    if all(operator.inverse is not None for operator in potential_operators):
+        return solve_backward(target, number_list, potential_operators)
+    return solve_forward(target, number_list, potential_operators)
+
+def solve_frontier(target: int, number_list: list[int], potential_operators: list[Operator],
+                   max_frontier: int | None = MAX_FRONTIER) -> bool:
+    ''' Breadth-first alternative to the depth-first solvers: carries the set of distinct partial
+    values left to right, dropping those above the target as soon as `pruning_start` allows.
+    Equations with many small operands collapse onto few distinct values.  If the set grows past
+    `max_frontier` values, the equation is handed to `is_solvable` instead.'''
+    prune_from = pruning_start(number_list, potential_operators)
+    forwards = [operator.forward for operator in potential_operators]
+    frontier = {number_list[0]}
+    for index in range(1, len(number_list)):
+        number = number_list[index]
+        frontier = {forward(value, number) for value in frontier for forward in forwards}
+        if prune_from is not None and index + 1 >= prune_from:
+            frontier = {value for value in frontier if value <= target}
+            if not frontier:
+                return False
+        if max_frontier is not None and len(frontier) > max_frontier:
+            return is_solvable(target, number_list, potential_operators)
+    return target in frontier
+
+def find_calibration_result(filename: Path, operator_list: list[Operator], engine: str = 'backward',
+                            max_frontier: int | None = MAX_FRONTIER) -> int:
+    if engine == 'frontier':
+        solve = lambda test_value, number_list: solve_frontier(test_value, number_list, operator_list, max_frontier)
+    elif engine == 'backward':
+        solve = lambda test_value, number_list: is_solvable(test_value, number_list, operator_list)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+    input_data = ingest_data(filename)
+
+    valid_equations = list()
+    for equation_input in alive_it(input_data):
+        test_value, number_list = equation_input
+        if solve(test_value, number_list):
+            valid_equations.append(test_value)
+        
+    return sum(valid_equations)
+
+def find_calibration_result_enumerated(filename: Path, operator_list: list[Operator]) -> int:
+    ''' The original brute force over every operator combination, kept for comparison.'''
     input_data = ingest_data(filename)
 
     valid_equations = list()
@@ -116,12 +284,117 @@ def find_calibration_result(filename: Path, operator_list: list[str]) -> int:
         
     return sum(valid_equations)
 
+WORKER_STATE: dict = {}  # per-process operator selection for the parallel calibration
+
+def init_calibration_worker(operator_symbols: list[str]) -> None:
+    ''' Operators hold lambdas and can't be pickled, so workers look them up in their own
+    registry by symbol.'''
+    WORKER_STATE['operators'] = select_operators(*operator_symbols)
+
+def check_equation_chunk(equations: list[tuple[int, list[int]]]) -> int:
+    operators = WORKER_STATE['operators']
+    return sum(test_value for test_value, number_list in equations if is_solvable(test_value, number_list, operators))
+
+def shard_equations(equations: Iterable[tuple[int, list[int]]], chunk_size: int = EQUATION_CHUNK_SIZE,
+                    window: int | None = None) -> Iterator[list[tuple[int, list[int]]]]:
+    ''' Chunks of equations, longest first: the cost grows exponentially with the number of
+    operands, so the expensive chunks should start early rather than straggle at the end.
+    With `window` set, only that many equations are read and sorted at a time.'''
+    equations = iter(equations)
+    while batch := list(itertools.islice(equations, window)):
+        batch.sort(key=lambda equation: len(equation[1]), reverse=True)
+        for i in range(0, len(batch), chunk_size):
+            yield batch[i:i + chunk_size]
+        if window is None:
+            break
+
+def find_calibration_result_parallel(filename: Path, operator_list: list[Operator], max_workers: int | None = None,
+                                     chunk_size: int = EQUATION_CHUNK_SIZE, stream: bool = False) -> int:
+    ''' Same total as `find_calibration_result`, with the equations sharded across a process pool
+    and the chunk sums added up as they finish.  With `stream`, equations are read from the file
+    a window at a time and only a couple of chunks per worker are kept in flight.'''
+    operator_symbols = [operator.symbol for operator in operator_list]
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_calibration_worker,
+                             initargs=(operator_symbols,)) as executor:
+        if stream:
+            chunks = shard_equations(stream_equations(filename), chunk_size, chunk_size * STREAM_WINDOW_CHUNKS)
+            max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+        else:
+            chunks = shard_equations(ingest_data(filename), chunk_size)
+            max_in_flight = None
+
+        total = 0
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(check_equation_chunk, chunk))
+            if max_in_flight is not None and len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                total += sum(future.result() for future in done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            total += sum(future.result() for future in done)
+    return total
+
 def part_one(filename: Path) -> int:
     return find_calibration_result(filename, OPERATORS_PART_ONE)
 
 def part_two(filename: Path) -> int:
     return find_calibration_result(filename, OPERATORS_PART_TWO)
 
+def random_equations(num_equations: int, max_numbers: int = 12, max_number: int = 999,
+                     operator_list: list[Operator] = OPERATORS_PART_TWO) -> list[tuple[int, list[int]]]:
+    ''' Half the test values are built from a random operator combination, half are random.'''
+    equations = []
+    for _ in range(num_equations):
+        number_list = [random.randint(1, max_number) for _ in range(random.randint(2, max_numbers))]
+        if random.random() < 0.5:
+            operators = random.choices(operator_list, k=len(number_list) - 1)
+            test_value = parse_operator_list(number_list.copy(), operators)
+        else:
+            test_value = random.randint(1, 10**12)
+        equations.append((test_value, number_list))
+    return equations
+
+def write_equations(filename: Path, equations: list[tuple[int, list[int]]]) -> None:
+    with open(filename, 'w') as f:
+        f.writelines(f"{test_value}: {' '.join(map(str, number_list))}\n" for test_value, number_list in equations)
+
+def benchmark_solver(num_equations: int = 100, filename: Path = Path('/tmp/day7_benchmark.txt')) -> None:
+    ''' Equations of up to 12 numbers, like the puzzle input; enumeration needs ~0.4s for each.'''
+    write_equations(filename, random_equations(num_equations))
+    enumerated_time = timeit.timeit(lambda: find_calibration_result_enumerated(filename, OPERATORS_PART_TWO), number=1)
+    backward_time = timeit.timeit(lambda: find_calibration_result(filename, OPERATORS_PART_TWO), number=1)
+    print(f"Part two on {num_equations} equations:  enumeration {enumerated_time:.2f}s  |  backward pruning {backward_time:.4f}s")
+
+def random_small_operand_equations(num_equations: int, num_numbers: int = 20, operands: tuple[int, ...] = (1, 1, 2),
+                                   max_test_value: int = 999) -> list[tuple[int, list[int]]]:
+    ''' Long equations of mostly ones: `* 1` always undoes, so depth-first search branches on
+    nearly every number, while the frontier collapses onto at most `max_test_value` values.'''
+    return [(random.randint(num_numbers, max_test_value), random.choices(operands, k=num_numbers))
+            for _ in range(num_equations)]
+
+def benchmark_frontier(num_equations: int = 200, filename: Path = Path('/tmp/day7_frontier_benchmark.txt')) -> None:
+    for description, equations in [('puzzle-like', random_equations(num_equations)),
+                                   ('small operands', random_small_operand_equations(num_equations))]:
+        write_equations(filename, equations)
+        backward_time = timeit.timeit(lambda: find_calibration_result(filename, OPERATORS_PART_TWO), number=1)
+        frontier_time = timeit.timeit(lambda: find_calibration_result(filename, OPERATORS_PART_TWO, 'frontier'), number=1)
+        capped_time = timeit.timeit(lambda: find_calibration_result(filename, OPERATORS_PART_TWO, 'frontier', 1_000), number=1)
+        print(f"{num_equations} {description} equations:  backward {backward_time:.3f}s  |  frontier {frontier_time:.3f}s  "
+              f"|  frontier capped at 1000 values {capped_time:.3f}s")
+
+def benchmark_parallel(num_equations: int = 100_000, worker_counts: tuple[int, ...] = (1, 2, 4, 8),
+                       chunk_size: int = EQUATION_CHUNK_SIZE, filename: Path = Path('/tmp/day7_parallel_benchmark.txt')) -> None:
+    write_equations(filename, random_equations(num_equations))
+    serial_time = timeit.timeit(lambda: find_calibration_result(filename, OPERATORS_PART_TWO), number=1)
+    print(f"Part two on {num_equations} equations, serial:  {serial_time:.3f}s")
+    for max_workers in worker_counts:
+        for stream in (False, True):
+            parallel_time = timeit.timeit(lambda: find_calibration_result_parallel(filename, OPERATORS_PART_TWO, max_workers,
+                                                                                   chunk_size, stream), number=1)
+            mode = 'streamed' if stream else 'loaded'
+            print(f"Part two on {num_equations} equations, {max_workers} workers ({mode}):  {parallel_time:.3f}s  ({serial_time / parallel_time:.1f}x)")
+
 def main():
     print(f"Part One (example):  {part_one(EXAMPLE)}") # should be 3749
     print(f"Part One (input):  {part_one(INPUT)}") # 1038838357795
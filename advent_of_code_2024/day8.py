@@ -89,8 +89,8 @@ from copy import deepcopy
 from typing import NamedTuple, Protocol
 from enum import Enum
 from dataclasses import dataclass
-from string import ascii_letters
-import itertools
+from functools import cached_property
+from string import ascii_letters, digits
 import pandas as pd
 import numpy as np
 from alive_progress import alive_it
@@ -99,6 +99,9 @@ from advent_of_code_2024.constants import DATA_DIR
 EXAMPLE = DATA_DIR / 'day8_example.txt'
 INPUT = DATA_DIR / 'day8_input.txt'
 
+IS_ANTENNA = np.zeros(256, dtype=bool)
+IS_ANTENNA[np.frombuffer((ascii_letters + digits).encode(), dtype=np.uint8)] = True
+
 @dataclass(frozen=True)
 class Antenna():
     char: str
@@ -110,21 +113,6 @@ class Antenna():
         return np.array([self.row_num, self.col_num])
         
 
-@dataclass(frozen=True)
-class Antinode():
-    char: str
-    row_num: int
-    col_num: int
-
-    def validate(self, map_height: int) -> bool:
-        return self.row_num >= 0 and self.row_num < map_height and self.col_num >= 0 and self.col_num < map_height
-
-    def __eq__(self, other) -> bool:
-        return self.row_num == other.row_num and self.col_num == other.col_num
-
-    def __hash__(self):
-        return hash((self.row_num, self.col_num))
-
 @dataclass
 class Map():
     row_list: list[str]
@@ -135,7 +123,7 @@ class Map():
 
     @property
     def width(self) -> int:
-        return len(self.row_list)
+        return len(self.row_list[0])
 
     @property
     def string(self) -> str:
@@ -158,31 +146,37 @@ class Map():
         for row in self.row_list:
             print(row)
 
-    def find_antinodes(self) -> set[Antinode]:
-        output_list: list[Antinode] = []
-        for char in self.antenna_types:
-            antennas = [x for x in self.antenna_list if x.char == char]
-            combos = itertools.combinations(antennas, 2)
-            for combo in combos:
-                antenna_1 = combo[0]
-                antenna_2 = combo[1]
-                # print(f"{antenna_1} - {antenna_2}")
-                output_list += self.calculate_antinodes(antenna_1, antenna_2)
-        return set([antinode for antinode in output_list if antinode.validate(map_height=self.height)])
-
-    def calculate_antinodes(self, antenna_1: Antenna, antenna_2: Antenna) -> tuple[Antinode, Antinode]:                
-        row_diff = antenna_1.row_num - antenna_2.row_num
-        col_diff = antenna_1.col_num - antenna_2.col_num
-        
-        antinode_1 = Antinode(char=antenna_1.char,
-                              row_num=antenna_1.row_num - row_diff,
-                              col_num=antenna_1.col_num - col_diff)
-
-        antinode_2 = Antinode(char=antenna_2.char,
-                              row_num=antenna_2.row_num + row_diff,
-                              col_num=antenna_2.col_num + col_diff)
-
-        return (antinode_1, antinode_2)
+    @cached_property
+    def frequency_index(self) -> dict[str, np.ndarray]:
+        ''' (row, col) coordinates of every antenna, one (n, 2) array per frequency, from a single
+        pass over the grid.'''
+        grid = np.frombuffer(''.join(self.row_list).encode(), dtype=np.uint8)
+        positions = np.flatnonzero(IS_ANTENNA[grid])
+        positions = positions[np.argsort(grid[positions], kind='stable')]
+        frequencies, starts = np.unique(grid[positions], return_index=True)
+        return {chr(frequency): np.column_stack(np.divmod(group, self.width))
+                for frequency, group in zip(frequencies, np.split(positions, starts[1:]))}
+
+    def find_antinodes(self, resonant: bool = False) -> np.ndarray:
+        ''' Flat row-major occupancy mask of the antinode cells.  Every ordered pair of same-frequency
+        antennas (a, b) puts an antinode at a + (a - b); with `resonant`, at every grid point on the
+        line through a and b, i.e. a + k * (a - b) / gcd(a - b) for every integer k that stays on the map.'''
+        occupied = np.zeros(self.height * self.width, dtype=bool)
+        reach = max(self.height, self.width)
+        multiples = np.arange(1 - reach, reach) if resonant else np.array([1])
+        for coords in self.frequency_index.values():
+            if len(coords) < 2:
+                continue
+            pairs = ~np.eye(len(coords), dtype=bool)
+            steps = (coords[:, None, :] - coords[None, :, :])[pairs]
+            origins = np.broadcast_to(coords[:, None, :], (len(coords), len(coords), 2))[pairs]
+            if resonant:  # every grid point on the line, not just whole multiples of the pair's offset
+                steps = steps // np.gcd(steps[:, 0], steps[:, 1])[:, None]
+            points = (origins[None, :, :] + multiples[:, None, None] * steps[None, :, :]).reshape(-1, 2)
+            rows, cols = points[:, 0], points[:, 1]
+            on_map = (rows >= 0) & (rows < self.height) & (cols >= 0) & (cols < self.width)
+            occupied[rows[on_map] * self.width + cols[on_map]] = True
+        return occupied
             
 
 def create_map(filename: Path) -> Map:
@@ -191,33 +185,20 @@ def create_map(filename: Path) -> Map:
         
     return Map(line_list)
 
-def part_one(filename: Path):
+def part_one(filename: Path) -> int:
+    map = create_map(filename)
+    return int(map.find_antinodes().sum())
+
+def part_two(filename: Path) -> int:
     map = create_map(filename)
-    # map.print()
-    # print()
-    # print(map.antenna_list)
-    # print(map.antenna_types)
-    antinodes = map.find_antinodes()
-    # print(map.height)
-    # print(asdf)
-    return len(antinodes)
-
-def part_two(filename: Path):
-    ...
+    return int(map.find_antinodes(resonant=True).sum())
 
 def main():
     print(f"Part One (example):  {part_one(EXAMPLE)}") # 14
     print(f"Part One (input):  {part_one(INPUT)}") # 393 is too high; 370 is too high; 360 is too low
-    # print()
-    # print(f"Part Two (example):  {part_two(EXAMPLE)}")
-    # print(f"Part Two (input):  {part_two(INPUT)}")
-
-    # aaa = Antinode('C', 1, 1)
-    # bbb = Antinode('D', 1, 1)
-    # print(aaa == bbb)
-    # c = [aaa, bbb]
-    # print(c)
-    # print(set(c))
+    print()
+    print(f"Part Two (example):  {part_two(EXAMPLE)}") # 34
+    print(f"Part Two (input):  {part_two(INPUT)}")
 
     # f = [1, 2, 3]
     # print(list(itertools.combinations(f, 2)))